@@ -62,6 +62,7 @@ fi
 
 mkdir -p "$INSTALL_DIR"
 mkdir -p "$INSTALL_DIR/backup"
+mkdir -p "$INSTALL_DIR/scratch"
 mkdir -p "$INSTALL_DIR/logs"
 
 # Install system dependencies
@@ -10,13 +10,21 @@ import RPi.GPIO as GPIO
 from onedrivesdk import get_default_client, AuthProvider
 import json
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import sqlite3
 import hashlib
 import psutil
 import threading
+import multiprocessing
+import collections
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from dotenv import load_dotenv
 import subprocess
+import shutil
+from urllib.parse import quote
+import fcntl
 
 class NotificationPriority:
     CRITICAL = 5    # System down, critical failures
@@ -25,6 +33,117 @@ class NotificationPriority:
     LOW = 2         # Recovery events, disk warnings
     INFO = 1        # Self-healing events
 
+USBDEVFS_RESET = 0x5514  # _IO('U', 20) from linux/usbdevice_fs.h
+CANON_VENDOR_ID = '04a9'
+MODEM_OK = b"\r\nOK\r\n"
+MODEM_ERRORS = (b"\r\nERROR\r\n", b"\r\n+CME ERROR:", b"\r\n+CMS ERROR:")
+
+def _reset_canon_usb():
+    """Reset any attached Canon USB device via ioctl, returning True if one was reset"""
+    reset = False
+    for device in Path('/sys/bus/usb/devices').iterdir():
+        try:
+            if (device / 'idVendor').read_text().strip() != CANON_VENDOR_ID:
+                continue
+            busnum = int((device / 'busnum').read_text())
+            devnum = int((device / 'devnum').read_text())
+        except (OSError, ValueError):
+            continue  # Interfaces and hubs without vendor info
+        
+        node = f'/dev/bus/usb/{busnum:03d}/{devnum:03d}'
+        try:
+            fd = os.open(node, os.O_WRONLY)
+            try:
+                fcntl.ioctl(fd, USBDEVFS_RESET, 0)
+                reset = True
+            finally:
+                os.close(fd)
+        except OSError as e:
+            # A failed reset should not stop the connection attempt
+            logging.warning(f"USB reset of {node} failed: {e}")
+    return reset
+
+def _make_http_session(retries=2):
+    """Create a keep-alive HTTP session with a small retrying connection pool"""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=2,
+        pool_maxsize=4,
+        max_retries=Retry(total=retries, backoff_factor=0.5)
+    )
+    session.mount('https://', adapter)
+    return session
+
+def _post_ntfy(session, ntfy_url, message, priority):
+    """Post a notification to ntfy.sh, raising on failure"""
+    headers = {
+        "Priority": str(priority),
+        "Title": "Timelapse Monitor Alert",
+        "Tags": "warning"
+    }
+    
+    response = session.post(
+        ntfy_url,
+        data=message.encode(encoding='utf-8'),
+        headers=headers,
+        timeout=10  # Add timeout
+    )
+    response.raise_for_status()
+
+def _system_monitor_entry(ntfy_url, disk_critical, disk_warn, temp_critical, temp_warn):
+    """Monitor system health in a separate process"""
+    session = _make_http_session()
+    
+    # Keep the thermal sysfs file open and re-read it with pread each tick
+    try:
+        thermal_fd = os.open('/sys/class/thermal/thermal_zone0/temp', os.O_RDONLY)
+    except OSError:
+        thermal_fd = None  # Temperature reading not critical
+    
+    def notify(message, priority):
+        try:
+            _post_ntfy(session, ntfy_url, message, priority)
+        except Exception as e:
+            logging.error(f"System monitor notification failed: {e}")
+    
+    while True:
+        try:
+            # Check disk space
+            disk_usage = psutil.disk_usage('/')
+            if disk_usage.percent >= disk_critical:
+                notify(
+                    f"Critical: Disk space low ({disk_usage.percent}% used)",
+                    NotificationPriority.CRITICAL
+                )
+            elif disk_usage.percent >= disk_warn:
+                notify(
+                    f"Warning: Disk space getting low ({disk_usage.percent}% used)",
+                    NotificationPriority.LOW
+                )
+            
+            # Check CPU temperature
+            try:
+                if thermal_fd is not None:
+                    temp = int(os.pread(thermal_fd, 16, 0)) / 1000
+                    if temp >= temp_critical:
+                        notify(
+                            f"Critical: System temperature {temp}°C",
+                            NotificationPriority.CRITICAL
+                        )
+                    elif temp >= temp_warn:
+                        notify(
+                            f"Warning: System temperature {temp}°C",
+                            NotificationPriority.HIGH
+                        )
+            except:
+                pass  # Temperature reading not critical
+            
+            time.sleep(300)  # Check every 5 minutes
+            
+        except Exception as e:
+            logging.error(f"System monitor error: {e}")
+            time.sleep(60)  # Retry after 1 minute
+
 class TimelapseMonitor:
     def __init__(self):
         # Load environment variables
@@ -52,32 +171,114 @@ class TimelapseMonitor:
         
         # Camera monitoring settings
         self.camera = None
+        self._camera_lock = threading.Lock()  # gphoto2 is not reentrant on one handle
         self.processed_files = set()
+        self.processed_order = collections.deque(maxlen=1000)  # Eviction order for processed_files
         self.check_interval = int(os.getenv('CHECK_INTERVAL', '60'))
         self.connect_retries = 3
         self.consecutive_failures = 0
         self.max_consecutive_failures = 3
+        self.max_retries = int(os.getenv('MAX_RETRIES', '5'))
+        
+        # System health thresholds
+        self.disk_critical = int(os.getenv('DISK_CRITICAL_THRESHOLD', '10'))
+        self.disk_warn = int(os.getenv('DISK_WARNING_THRESHOLD', '25'))
+        self.temp_critical = int(os.getenv('TEMP_CRITICAL_THRESHOLD', '80'))
+        self.temp_warn = int(os.getenv('TEMP_WARNING_THRESHOLD', '70'))
+        
+        # Notification settings
+        self.ntfy_topic = os.getenv('NTFY_TOPIC')
+        self.ntfy_url = f"https://ntfy.sh/{self.ntfy_topic}"
+        self.admin_phone = os.getenv('ADMIN_PHONE')
+        
+        # Start monitoring process, kept outside the GIL of the main loop. Forked
+        # before the DB connection, HTTP pool and GPIO event thread exist
+        self.monitor_process = multiprocessing.Process(
+            target=_system_monitor_entry,
+            args=(self.ntfy_url, self.disk_critical, self.disk_warn, self.temp_critical, self.temp_warn),
+            daemon=True
+        )
+        self.monitor_process.start()
         
-        # Local storage for temporary files
-        self.temp_dir = Path("/tmp/timelapse_monitor")
+        # Keep-alive HTTP session for ntfy.sh and network checks
+        self.http = _make_http_session()
+        
+        # Worker pool so uploads overlap with the next camera download
+        self.io_pool = ThreadPoolExecutor(max_workers=2)
+        self.max_pending_uploads = 2
+        
+        # Backlog uploads run alongside new-image checks; total uploads are bounded
+        self.backup_pool = ThreadPoolExecutor(max_workers=1)
+        self.backup_job = None
+        self._stopping = threading.Event()  # Ends a backlog pass early on shutdown
+        self.upload_slots = threading.BoundedSemaphore(2)
+        
+        # Local storage for downloads; scratch shares the backup filesystem so
+        # moving a failed upload to backup is a rename rather than a copy
+        self.scratch_dir = Path("/opt/timelapse/scratch")
         self.backup_dir = Path("/opt/timelapse/backup")
-        self.temp_dir.mkdir(exist_ok=True)
+        self.scratch_dir.mkdir(exist_ok=True)
         self.backup_dir.mkdir(exist_ok=True)
         
-        # Database path
+        # Downloads interrupted by a crash or power cut are fetched again from the camera
+        for stale_file in self.scratch_dir.iterdir():
+            try:
+                stale_file.unlink()
+            except OSError as e:
+                logging.error(f"Failed to remove stale scratch file {stale_file}: {e}")
+        
+        # Database connection, guarded by a lock for cross-thread use
         self.db_path = Path("/opt/timelapse/timelapse_monitor.db")
+        self.db = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("PRAGMA temp_store=MEMORY")
+        self.db.execute("PRAGMA mmap_size=16777216")  # 16 MiB
+        self.db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS processed_files (
+                filename TEXT PRIMARY KEY,
+                local_name TEXT,
+                checksum TEXT,
+                size INTEGER,
+                processed_at TIMESTAMP,
+                upload_status TEXT,
+                retries INTEGER DEFAULT 0
+            )
+            """
+        )
+        self._db_lock = threading.Lock()
+        
+        # Record a new file in one statement; rows already uploaded or owned by
+        # the backlog pass in process_backup_files are left untouched
+        self._insert_file_stmt = """
+            INSERT INTO processed_files
+            (filename, local_name, checksum, size, processed_at, upload_status, retries)
+            VALUES (?, ?, ?, ?, ?, 'pending', 0)
+            ON CONFLICT(filename) DO UPDATE SET
+                local_name = excluded.local_name,
+                checksum = excluded.checksum,
+                size = excluded.size,
+                processed_at = excluded.processed_at,
+                upload_status = 'pending',
+                retries = 0
+            WHERE upload_status NOT IN ('success', 'backup')
+            """
         
         # 4G Modem settings
-        self.modem_serial = serial.Serial('/dev/ttyUSB0', 115200, timeout=1)
+        self.modem_serial = serial.Serial('/dev/ttyUSB0', 115200, timeout=0.1)
+        self._modem_lock = threading.Lock()
         
         # OneDrive settings
         self.client_id = os.getenv('ONEDRIVE_CLIENT_ID')
         self.client_secret = os.getenv('ONEDRIVE_CLIENT_SECRET')
         self.scopes = ['wl.signin', 'wl.offline_access', 'onedrive.readwrite']
-        
-        # Notification settings
-        self.ntfy_topic = os.getenv('NTFY_TOPIC')
-        self.ntfy_url = f"https://ntfy.sh/{self.ntfy_topic}"
+        self.simple_upload_limit = 4 * 1024 * 1024  # Larger files use an upload session
+        self.upload_chunk_size = 10 * 1024 * 1024  # Must be a multiple of 320 KiB
+        self.chunk_retries = 3
+        self._auth_lock = threading.Lock()  # AuthProvider token refresh is not thread-safe
+        # No transport-level retries: upload_large_file retries ranges itself
+        self.onedrive_http = _make_http_session(retries=0)
         
         # UPS monitoring pins
         self.UPS_PIN = 18  # GPIO pin for UPS status
@@ -88,9 +289,12 @@ class TimelapseMonitor:
         self.init_4g()
         self.init_onedrive()
         
-        # Start monitoring thread
-        self.monitor_thread = threading.Thread(target=self.system_monitor, daemon=True)
-        self.monitor_thread.start()
+        # React to UPS changes immediately instead of polling in the main loop.
+        # Registered after init_4g so an edge's SMS fallback can't interleave with it
+        self._power_ok = True
+        self._power_lock = threading.Lock()  # Edge callbacks and run() both update _power_ok
+        GPIO.add_event_detect(self.UPS_PIN, GPIO.BOTH, callback=self._ups_edge, bouncetime=200)
+        self._ups_edge(self.UPS_PIN)  # Pick up a power failure present at startup
 
     def connect_camera(self):
         """Attempt to connect to the camera with retries"""
@@ -98,8 +302,7 @@ class TimelapseMonitor:
             try:
                 # Reset USB connection if needed
                 if attempt > 0:
-                    subprocess.run(['sudo', 'usbreset', '0x04a9'], 
-                                 capture_output=True, text=True)
+                    _reset_canon_usb()
                     time.sleep(2)
                 
                 # Initialize camera connection
@@ -124,6 +327,7 @@ class TimelapseMonitor:
 
     def init_onedrive(self):
         """Initialize OneDrive connection with token refresh handling"""
+        self._timelapse_folder_id = None
         try:
             self.auth = AuthProvider(
                 self.client_id,
@@ -134,12 +338,14 @@ class TimelapseMonitor:
             
             # Test connection and token
             self.client.drive.get()
+            self.cache_timelapse_folder()
             logging.info("OneDrive initialized successfully")
         except Exception as e:
             if "token expired" in str(e).lower():
                 try:
                     self.auth.refresh_token()
                     self.client = get_default_client(self.auth)
+                    self.cache_timelapse_folder()
                     logging.info("OneDrive token refreshed successfully")
                 except Exception as refresh_error:
                     logging.error(f"OneDrive token refresh failed: {refresh_error}")
@@ -148,6 +354,20 @@ class TimelapseMonitor:
                 logging.error(f"OneDrive initialization failed: {e}")
                 self.send_notification("OneDrive initialization failed", NotificationPriority.HIGH)
 
+    def cache_timelapse_folder(self):
+        """Look up the Timelapse folder id once so uploads can address it directly"""
+        try:
+            self._timelapse_folder_id = self.client.item(drive='me', path='/Timelapse').get().id
+        except Exception as e:
+            # Uploads fall back to the path, which also creates the folder
+            logging.warning(f"Could not resolve OneDrive Timelapse folder: {e}")
+
+    def _onedrive_upload_path(self, filename):
+        """API path for a file in the Timelapse folder, by cached folder id when known"""
+        if self._timelapse_folder_id:
+            return f"drive/items/{self._timelapse_folder_id}:/{quote(filename)}:"
+        return f"drive/root:/Timelapse/{quote(filename)}:"
+
     def init_4g(self):
         """Initialize the 4G modem"""
         try:
@@ -160,9 +380,7 @@ class TimelapseMonitor:
             ]
             
             for cmd in commands:
-                self.modem_serial.write((cmd + '\r\n').encode())
-                time.sleep(1)
-                response = self.modem_serial.read_all().decode()
+                _, response = self._at(cmd + '\r\n')
                 logging.info(f"Modem response to {cmd}: {response}")
                 
             logging.info("4G modem initialized successfully")
@@ -170,6 +388,23 @@ class TimelapseMonitor:
             logging.error(f"4G modem initialization failed: {str(e)}")
             self.send_notification("4G modem initialization failed", NotificationPriority.HIGH)
 
+    def _at(self, cmd, timeout=2.0, terminator=MODEM_OK):
+        """Send a modem command and return (ok, response) once the terminator or an error arrives"""
+        # Drop leftovers from an earlier command that timed out
+        self.modem_serial.reset_input_buffer()
+        self.modem_serial.write(cmd.encode())
+        deadline = time.monotonic() + timeout
+        response = b""
+        ok = False
+        while time.monotonic() < deadline:
+            response += self.modem_serial.read(self.modem_serial.in_waiting or 1)
+            if any(error in response for error in MODEM_ERRORS):
+                break
+            if terminator in response:
+                ok = True
+                break
+        return ok, response.decode(errors='replace')
+
     def check_network(self):
         """Check network connectivity with retry"""
         retry_count = 0
@@ -179,7 +414,7 @@ class TimelapseMonitor:
         while retry_count < max_retries:
             try:
                 # Try both IPv4 and IPv6
-                requests.get("https://1.1.1.1", timeout=5)
+                self.http.get("https://1.1.1.1", timeout=5)
                 return True
             except requests.exceptions.RequestException:
                 retry_count += 1
@@ -199,60 +434,59 @@ class TimelapseMonitor:
 
     def get_camera_files(self):
         """Get list of files from camera with connection handling"""
-        try:
-            if not self.camera and not self.connect_camera():
-                return []
+        with self._camera_lock:
+            try:
+                if not self.camera and not self.connect_camera():
+                    return []
             
-            file_list = self.camera.folder_list_files('/')
-            return [(f.name, f) for f in file_list]
+                file_list = self.camera.folder_list_files('/')
+                return [(f.name, f) for f in file_list]
             
-        except gp.GPhoto2Error as gp_error:
-            logging.error(f"GPhoto2 error: {str(gp_error)}")
-            if "Camera is already in use" in str(gp_error):
-                # Handle busy camera - likely taking a photo
-                return []
+            except gp.GPhoto2Error as gp_error:
+                logging.error(f"GPhoto2 error: {str(gp_error)}")
+                if "Camera is already in use" in str(gp_error):
+                    # Handle busy camera - likely taking a photo
+                    return []
             
-            # For other errors, reset connection
-            if self.camera:
-                try:
-                    self.camera.exit()
-                except:
-                    pass
-                self.camera = None
-            return []
+                # For other errors, reset connection
+                if self.camera:
+                    try:
+                        self.camera.exit()
+                    except:
+                        pass
+                    self.camera = None
+                return []
             
-        except Exception as e:
-            logging.error(f"Error listing camera files: {str(e)}")
-            return []
+            except Exception as e:
+                logging.error(f"Error listing camera files: {str(e)}")
+                return []
 
     def download_file(self, file_info):
-        """Download a single file from the camera"""
+        """Download a single file from the camera, returning (path, checksum, size)"""
         filename, camera_file = file_info
-        local_path = self.temp_dir / f"timelapse_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
+        local_path = self.scratch_dir / f"timelapse_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
         
-        try:
-            if not self.camera and not self.connect_camera():
-                return None
+        with self._camera_lock:
+            try:
+                if not self.camera and not self.connect_camera():
+                    return None
                 
-            camera_file = self.camera.file_get(
-                '/',
-                filename,
-                gp.GP_FILE_TYPE_NORMAL
-            )
-            camera_file.save(str(local_path))
-            return local_path
+                camera_file = self.camera.file_get(
+                    '/',
+                    filename,
+                    gp.GP_FILE_TYPE_NORMAL
+                )
             
-        except Exception as e:
-            logging.error(f"Failed to download file {filename}: {str(e)}")
-            return None
-
-    def calculate_checksum(self, file_path):
-        """Calculate SHA-256 checksum of file"""
-        sha256_hash = hashlib.sha256()
-        with open(file_path, "rb") as f:
-            for byte_block in iter(lambda: f.read(4096), b""):
-                sha256_hash.update(byte_block)
-        return sha256_hash.hexdigest()
+                # Hash the in-memory buffer so the file is never re-read from disk
+                data = memoryview(camera_file.get_data_and_size())
+                checksum = hashlib.sha256(data).hexdigest()
+                with open(local_path, 'wb') as f:
+                    f.write(data)
+                return local_path, checksum, data.nbytes
+            
+            except Exception as e:
+                logging.error(f"Failed to download file {filename}: {str(e)}")
+                return None
 
     def verify_file(self, file_path, original_size=None):
         """Verify file integrity"""
@@ -265,45 +499,34 @@ class TimelapseMonitor:
             
         return True
 
-    def handle_file_processing(self, filename, local_path):
+    def handle_file_processing(self, filename, local_path, checksum, file_size):
         """Handle file processing with database tracking"""
         try:
-            checksum = self.calculate_checksum(local_path)
-            file_size = local_path.stat().st_size
-            
-            with sqlite3.connect(self.db_path) as conn:
-                # Check if file was already processed
-                cursor = conn.execute(
-                    "SELECT filename FROM processed_files WHERE filename = ? AND upload_status = 'success'",
-                    (filename,)
+            with self._db_lock:
+                # Store file info; no row changes if it was already processed or is in backup
+                cursor = self.db.execute(
+                    self._insert_file_stmt,
+                    (filename, local_path.name, checksum, file_size, datetime.now())
                 )
-                if cursor.fetchone():
+                if cursor.rowcount == 0:
+                    local_path.unlink()  # Uploaded or queued in backup, drop the duplicate download
                     return True
-                
-                # Store file info
-                conn.execute(
-                    """
-                    INSERT OR REPLACE INTO processed_files 
-                    (filename, checksum, size, processed_at, upload_status, retries)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                    """,
-                    (filename, checksum, file_size, datetime.now(), 'pending', 0)
-                )
             
-            # Try OneDrive upload
+            # Try OneDrive upload, which moves the file to backup on failure
+            backup_path = self.backup_dir / local_path.name
             if self.upload_to_onedrive(local_path):
-                with sqlite3.connect(self.db_path) as conn:
-                    conn.execute(
+                with self._db_lock:
+                    self.db.execute(
                         "UPDATE processed_files SET upload_status = 'success' WHERE filename = ?",
                         (filename,)
                     )
                 return True
             
-            # If OneDrive fails, save to backup location
-            backup_path = self.backup_dir / filename
-            local_path.rename(backup_path)
-            with sqlite3.connect(self.db_path) as conn:
-                conn.execute(
+            # If OneDrive fails, record the backup location
+            if not backup_path.exists():
+                raise Exception("File could not be moved to backup storage")
+            with self._db_lock:
+                self.db.execute(
                     "UPDATE processed_files SET upload_status = 'backup' WHERE filename = ?",
                     (filename,)
                 )
@@ -322,26 +545,34 @@ class TimelapseMonitor:
             return False
 
     def upload_to_onedrive(self, filepath):
-        """Upload file to OneDrive with proper cleanup"""
-        temp_files = []
+        """Upload file to OneDrive, moving it to backup on failure"""
         try:
             filename = filepath.name
             
-            # Create temporary copy for upload
-            temp_path = self.temp_dir / f"upload_{filename}"
-            temp_files.append(temp_path)
+            # Verify file before upload
+            if not self.verify_file(filepath):
+                raise Exception("File verification failed before upload")
             
-            with open(filepath, 'rb') as src:
-                with open(temp_path, 'wb') as dst:
-                    dst.write(src.read())
+            # Attempt upload straight from the original file
+            file_size = filepath.stat().st_size
+            with self.upload_slots:
+                try:
+                    item = self.upload_file(filepath, file_size)
+                except requests.exceptions.HTTPError as e:
+                    if not self._timelapse_folder_id or e.response is None or e.response.status_code != 404:
+                        raise
+                    # Cached folder was deleted or recreated; retry once by path
+                    logging.warning(f"OneDrive Timelapse folder id is stale, retrying {filename} by path")
+                    self._timelapse_folder_id = None
+                    item = self.upload_file(filepath, file_size)
             
-            # Verify copy
-            if not self.verify_file(temp_path, filepath.stat().st_size):
-                raise Exception("File verification failed after copy")
+            # Path uploads create the folder if needed; remember its id for next time
+            if not self._timelapse_folder_id:
+                self._timelapse_folder_id = item.get('parentReference', {}).get('id')
             
-            # Attempt upload
-            with open(temp_path, 'rb') as file:
-                self.client.item(drive='me', path=f'/Timelapse/{filename}').upload(file)
+            # Check the size OneDrive reports for the stored item
+            if item.get('size') != file_size:
+                raise Exception(f"Uploaded size mismatch: OneDrive reports {item.get('size')}, expected {file_size}")
             
             logging.info(f"File uploaded to OneDrive: {filename}")
             
@@ -355,40 +586,97 @@ class TimelapseMonitor:
             
             # Move to backup location on failure
             try:
+                # Keep the name so the OneDrive name is the same on retry
                 backup_path = self.backup_dir / filepath.name
-                filepath.rename(backup_path)
-                logging.info(f"File moved to backup: {backup_path}")
+                if filepath != backup_path:
+                    # A rename from scratch; shutil.move copies if filesystems ever differ
+                    shutil.move(str(filepath), str(backup_path))
+                    logging.info(f"File moved to backup: {backup_path}")
             except Exception as backup_error:
                 logging.error(f"Failed to move file to backup: {str(backup_error)}")
             
             return False
+
+    def upload_file(self, filepath, file_size):
+        """Upload a file to the Timelapse folder and return the uploaded item"""
+        if file_size > self.simple_upload_limit:
+            return self.upload_large_file(filepath, file_size)
+        
+        # Small files go up in a single PUT
+        with open(filepath, 'rb') as file:
+            return self._onedrive_request(
+                'PUT', f"{self._onedrive_upload_path(filepath.name)}/content", data=file
+            ).json()
+
+    def upload_large_file(self, filepath, file_size):
+        """Upload a large file through a resumable session and return the uploaded item"""
+        upload_session = self._onedrive_request(
+            'POST',
+            f"{self._onedrive_upload_path(filepath.name)}/createUploadSession"
+        ).json()
+        upload_url = upload_session['uploadUrl']
+        
+        try:
+            with open(filepath, 'rb') as file:
+                offset = 0
+                while offset < file_size:
+                    chunk = file.read(self.upload_chunk_size)
+                    if not chunk:
+                        raise Exception(f"File {filepath.name} shrank during upload")
+                    end = offset + len(chunk) - 1
+                    headers = {'Content-Range': f'bytes {offset}-{end}/{file_size}'}
+                    
+                    for attempt in range(self.chunk_retries):
+                        try:
+                            # Upload URLs are pre-authenticated, no bearer token needed
+                            response = self.onedrive_http.put(upload_url, data=chunk, headers=headers, timeout=120)
+                            response.raise_for_status()
+                            break
+                        except requests.exceptions.RequestException as e:
+                            if attempt == self.chunk_retries - 1:
+                                raise
+                            logging.warning(f"Upload of {filepath.name} range {offset}-{end} failed, retrying: {e}")
+                            time.sleep(5 * (2 ** attempt))  # Exponential backoff
+                    
+                    offset = end + 1
             
-        finally:
-            # Clean up any temporary files
-            for temp_file in temp_files:
-                try:
-                    if temp_file.exists():
-                        temp_file.unlink()
-                except Exception as cleanup_error:
-                    logging.error(f"Failed to clean up temporary file: {str(cleanup_error)}")
+            # The final range returns the completed item
+            return response.json()
+        except Exception:
+            # Cancel the session so the partial upload is discarded
+            try:
+                self.onedrive_http.delete(upload_url, timeout=10)
+            except requests.exceptions.RequestException:
+                pass
+            raise
+
+    def _onedrive_request(self, method, path, data=None, **kwargs):
+        """Send an authenticated OneDrive API request, refreshing the token once on 401"""
+        url = self.client.base_url + path
+        token = None
+        for attempt in range(2):
+            if attempt > 0:
+                # Upload threads can hit 401 together; only the first one refreshes
+                with self._auth_lock:
+                    if self.auth.access_token == token:
+                        self.auth.refresh_token()
+                if hasattr(data, 'seek'):
+                    data.seek(0)
+            
+            token = self.auth.access_token
+            headers = {'Authorization': f'bearer {token}'}
+            response = self.onedrive_http.request(method, url, data=data, headers=headers, timeout=60, **kwargs)
+            if response.status_code != 401:
+                break
+        
+        response.raise_for_status()
+        return response
 
     def send_notification(self, message, priority):
         """Send notification with fallback options"""
         try:
             # First try ntfy.sh
-            headers = {
-                "Priority": str(priority),
-                "Title": "Timelapse Monitor Alert",
-                "Tags": "warning"
-            }
-            
-            response = requests.post(
-                self.ntfy_url,
-                data=message.encode(encoding='utf-8'),
-                headers=headers,
-                timeout=10  # Add timeout
-            )
-            response.raise_for_status()
+            _post_ntfy(self.http, self.ntfy_url, message, priority)
             return True
         except Exception as e:
             logging.error(f"ntfy.sh notification failed: {e}")
@@ -397,17 +685,16 @@ class TimelapseMonitor:
                 # Fallback to 4G modem direct SMS
                 # AT commands for SMS
                 commands = [
-                    f'AT+CMGF=1\r',  # Text mode
-                    f'AT+CMGS="{os.getenv("ADMIN_PHONE")}"\r',  # Phone number from env
-                    f'{message}\x1A'  # Message content + CTRL+Z
+                    (f'AT+CMGF=1\r', MODEM_OK, 2.0),  # Text mode
+                    (f'AT+CMGS="{self.admin_phone}"\r', b"> ", 2.0),  # Phone number from env
+                    (f'{message}\x1A', MODEM_OK, 10.0)  # Message content + CTRL+Z, network round trip
                 ]
                 
-                for cmd in commands:
-                    self.modem_serial.write(cmd.encode())
-                    time.sleep(1)
-                    response = self.modem_serial.read_all().decode()
-                    if "ERROR" in response:
-                        raise Exception(f"Modem command failed: {response}")
+                with self._modem_lock:
+                    for cmd, terminator, timeout in commands:
+                        ok, response = self._at(cmd, timeout=timeout, terminator=terminator)
+                        if not ok:
+                            raise Exception(f"Modem command failed: {response}")
                 
                 logging.info("Notification sent via SMS fallback")
                 return True
@@ -415,36 +702,62 @@ class TimelapseMonitor:
                 logging.error(f"SMS notification failed: {sms_error}")
                 return False
 
-    def monitor_power(self):
-        """Monitor UPS power status"""
-        if GPIO.input(self.UPS_PIN) == GPIO.LOW:
+    def _ups_edge(self, channel):
+        """Track UPS power status from the pin level, notifying on each transition"""
+        with self._power_lock:
+            power_ok = GPIO.input(channel) != GPIO.LOW
+            if power_ok == self._power_ok:
+                return
+            self._power_ok = power_ok
+        
+        if not power_ok:
             logging.warning("Power failure detected!")
             self.send_notification("Power failure detected!", NotificationPriority.HIGH)
-            return False
-        return True
+        else:
+            logging.info("Power restored")
+            self.send_notification("Power restored", NotificationPriority.LOW)
+
+    def mark_processed(self, filename):
+        """Remember a processed file, evicting the oldest beyond 1000 entries"""
+        if filename in self.processed_files:
+            return
+        if len(self.processed_order) == self.processed_order.maxlen:
+            self.processed_files.discard(self.processed_order[0])
+        self.processed_order.append(filename)
+        self.processed_files.add(filename)
+
+    def finish_processing(self, filename, future):
+        """Wait for a submitted processing job and record its result"""
+        if future.result():
+            self.mark_processed(filename)
 
     def check_new_images(self):
         """Check for new images and process them"""
         try:
-            current_files = set(name for name, _ in self.get_camera_files())
+            # Single listing snapshot serves both the diff and the file infos
+            all_files = self.get_camera_files()
+            current_files = set(name for name, _ in all_files)
             new_files = current_files - self.processed_files
             
             if new_files:
                 logging.info(f"Found {len(new_files)} new images")
                 
-                # Get full file info for new files
-                all_files = self.get_camera_files()
                 new_file_infos = [f for f in all_files if f[0] in new_files]
                 
+                # Download on this thread while earlier files upload in the pool
+                pending = collections.deque()
                 for file_info in new_file_infos:
-                    local_path = self.download_file(file_info)
-                    if local_path:
-                        if self.handle_file_processing(file_info[0], local_path):
-                            self.processed_files.add(file_info[0])
+                    downloaded = self.download_file(file_info)
+                    if not downloaded:
+                        continue
+                    
+                    if len(pending) >= self.max_pending_uploads:
+                        self.finish_processing(*pending.popleft())
+                    future = self.io_pool.submit(self.handle_file_processing, file_info[0], *downloaded)
+                    pending.append((file_info[0], future))
                 
-                # Limit size of processed files set
-                if len(self.processed_files) > 1000:
-                    self.processed_files = set(list(self.processed_files)[-1000:])
+                while pending:
+                    self.finish_processing(*pending.popleft())
                     
         except Exception as e:
             logging.error(f"Failed to check new images: {str(e)}")
@@ -453,36 +766,65 @@ class TimelapseMonitor:
     def process_backup_files(self):
         """Try to upload files from backup storage"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.execute(
-                    "SELECT filename, retries FROM processed_files WHERE upload_status = 'backup'"
+            with self._db_lock:
+                cursor = self.db.execute(
+                    "SELECT filename, local_name, retries FROM processed_files WHERE upload_status = 'backup'"
                 )
-                backup_files = cursor.fetchall()
+                backup_files = [row for row in cursor.fetchall() if row[2] < self.max_retries]
             
-            for filename, retries in backup_files:
-                if retries >= int(os.getenv('MAX_RETRIES', '5')):
-                    continue
+            # Don't spend retries while the link is down
+            if not backup_files:
+                return
+            if not self.check_network():
+                logging.info("Network unavailable, skipping backup upload pass")
+                return
+            
+            success_names = []
+            retry_names = []
+            for filename, local_name, retries in backup_files:
+                if self._stopping.is_set():
+                    break
                     
-                backup_path = self.backup_dir / filename
+                backup_path = self.backup_dir / local_name
                 if not backup_path.exists():
                     continue
                 
                 if self.upload_to_onedrive(backup_path):
-                    with sqlite3.connect(self.db_path) as conn:
-                        conn.execute(
-                            "UPDATE processed_files SET upload_status = 'success' WHERE filename = ?",
-                            (filename,)
-                        )
+                    success_names.append(filename)
                     self.send_notification(
                         f"Successfully uploaded backup file {filename}",
                         NotificationPriority.LOW
                     )
+                elif not self.check_network():
+                    # Link dropped mid-pass; this failure is not the file's fault
+                    logging.info("Network lost, ending backup upload pass")
+                    break
                 else:
-                    with sqlite3.connect(self.db_path) as conn:
-                        conn.execute(
+                    retry_names.append(filename)
+                    if retries + 1 >= self.max_retries:
+                        self.send_notification(
+                            f"Giving up on backup file {local_name} after {retries + 1} failed uploads; "
+                            f"it remains in {self.backup_dir}",
+                            NotificationPriority.HIGH
+                        )
+            
+            # Record all status changes in a single transaction
+            if success_names or retry_names:
+                with self._db_lock:
+                    self.db.execute("BEGIN")
+                    try:
+                        self.db.executemany(
+                            "UPDATE processed_files SET upload_status = 'success' WHERE filename = ?",
+                            [(name,) for name in success_names]
+                        )
+                        self.db.executemany(
                             "UPDATE processed_files SET retries = retries + 1 WHERE filename = ?",
-                            (filename,)
+                            [(name,) for name in retry_names]
                         )
+                        self.db.execute("COMMIT")
+                    except Exception:
+                        self.db.execute("ROLLBACK")
+                        raise
                     
         except Exception as e:
             logging.error(f"Error processing backup files: {str(e)}")
@@ -491,72 +833,37 @@ class TimelapseMonitor:
                 NotificationPriority.HIGH
             )
 
-    def system_monitor(self):
-        """Monitor system health in separate thread"""
-        while True:
-            try:
-                # Check disk space
-                disk_usage = psutil.disk_usage('/')
-                if disk_usage.percent >= int(os.getenv('DISK_CRITICAL_THRESHOLD', '10')):
-                    self.send_notification(
-                        f"Critical: Disk space low ({disk_usage.percent}% used)",
-                        NotificationPriority.CRITICAL
-                    )
-                elif disk_usage.percent >= int(os.getenv('DISK_WARNING_THRESHOLD', '25')):
-                    self.send_notification(
-                        f"Warning: Disk space getting low ({disk_usage.percent}% used)",
-                        NotificationPriority.LOW
-                    )
-                
-                # Check CPU temperature
-                try:
-                    with open('/sys/class/thermal/thermal_zone0/temp', 'r') as f:
-                        temp = float(f.read().strip()) / 1000
-                        if temp >= int(os.getenv('TEMP_CRITICAL_THRESHOLD', '80')):
-                            self.send_notification(
-                                f"Critical: System temperature {temp}°C",
-                                NotificationPriority.CRITICAL
-                            )
-                        elif temp >= int(os.getenv('TEMP_WARNING_THRESHOLD', '70')):
-                            self.send_notification(
-                                f"Warning: System temperature {temp}°C",
-                                NotificationPriority.HIGH
-                            )
-                except:
-                    pass  # Temperature reading not critical
-                
-                time.sleep(300)  # Check every 5 minutes
-                
-            except Exception as e:
-                logging.error(f"System monitor error: {e}")
-                time.sleep(60)  # Retry after 1 minute
-
     def run(self):
         """Main monitoring loop"""
         logging.info("Starting timelapse monitoring")
         self.send_notification("Timelapse monitoring started", NotificationPriority.INFO)
         
+        # Ticks run on a fixed cadence, independent of how long each one takes
+        next_tick = time.monotonic()
         while True:
             try:
-                # Check power status
-                if not self.monitor_power():
+                # Check power status; re-read the pin in case the debounce dropped an edge
+                self._ups_edge(self.UPS_PIN)
+                if not self._power_ok:
                     self.consecutive_failures += 1
                 else:
                     self.consecutive_failures = 0
                 
+                # Work through backup files in the background, one pass at a time
+                if self.backup_job is None or self.backup_job.done():
+                    self.backup_job = self.backup_pool.submit(self.process_backup_files)
+                
                 # Check for new images
                 self.check_new_images()
                 
-                # Try to process any backup files
-                self.process_backup_files()
-                
                 # Disconnect camera between checks to allow sleep
-                if self.camera:
-                    try:
-                        self.camera.exit()
-                    except:
-                        pass
-                    self.camera = None
+                with self._camera_lock:
+                    if self.camera:
+                        try:
+                            self.camera.exit()
+                        except:
+                            pass
+                        self.camera = None
                 
                 # Check if we need to restart due to too many failures
                 if self.consecutive_failures >= self.max_consecutive_failures:
@@ -566,7 +873,13 @@ class TimelapseMonitor:
                     )
                     subprocess.run(['sudo', 'reboot'])
                 
-                time.sleep(self.check_interval)
+                next_tick += self.check_interval
+                delay = next_tick - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    logging.warning(f"Monitoring tick overran check interval by {-delay:.1f}s")
+                    next_tick = time.monotonic()  # Resync instead of bursting to catch up
                 
             except KeyboardInterrupt:
                 self.send_notification("Monitoring stopped by user", NotificationPriority.HIGH)
@@ -575,14 +888,20 @@ class TimelapseMonitor:
                 self.send_notification(f"Main loop error: {str(e)}", NotificationPriority.CRITICAL)
                 self.consecutive_failures += 1
                 time.sleep(60)
+                next_tick = time.monotonic()
 
     def cleanup(self):
         """Cleanup resources"""
         try:
+            # Waits for at most the upload in progress in each pool
+            self._stopping.set()
+            self.io_pool.shutdown(wait=True)
+            self.backup_pool.shutdown(wait=True)
             if self.camera:
                 self.camera.exit()
             GPIO.cleanup()
             self.modem_serial.close()
+            self.db.close()
             self.send_notification("System cleanup completed", NotificationPriority.INFO)
         except Exception as e:
             self.send_notification(f"Cleanup failed: {str(e)}", NotificationPriority.HIGH)